@@ -1,263 +1,550 @@
 import asyncio
 import websockets
-import json
+import websockets.exceptions
 import logging
+import re
+from typing import Any
+
+orjson: Any
+try:
+    import orjson  # type: ignore[import-not-found, no-redef]
+    HAS_ORJSON = True
+except ImportError:  # 未安裝 orjson 時退回標準庫 json，loads 與 JSONDecodeError 的介面相同
+    import json as orjson
+    HAS_ORJSON = False
+
+picows: Any
+try:
+    import picows  # type: ignore[import-not-found, no-redef]
+except ImportError:  # 未安裝 picows 時使用 websockets 伺服器
+    picows = None
+
+msgspec: Any
+try:
+    import msgspec  # type: ignore[import-not-found, no-redef]
+except ImportError:  # 未安裝 msgspec 時以 orjson 解析後手動校驗
+    msgspec = None
+
+mypyc_attr: Any
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:  # 未以 mypyc 編譯時不需要 mypy_extensions，裝飾器不做任何事
+    def mypyc_attr(*attrs, **kwattrs):
+        return lambda cls: cls
+
 
 # 設置日誌
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# 房間狀態
-rooms = {}
-# 客戶端對應的房間
-client_rooms = {}
+
+def dumps(obj):
+    """序列化為 JSON 文字 (保持以文字幀發送)
+
+    不傳入 default=，消息中只能使用 dict/list/str/int/None 等原生類型，
+    以確保 orjson 始終走 C 快速路徑；誤用 set 或自定義類型會直接拋出 TypeError。
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return orjson.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+if msgspec is not None:
+    # 入站消息，只校驗路由所需的 room_id 與 ack (為真時回覆 DATA_RECEIVED 確認)，其餘欄位不解碼
+    # 以 defstruct 定義而非 class 語句，因為 mypyc 不支持條件分支中的類定義
+    InMsg = msgspec.defstruct("InMsg", [("room_id", str | int), ("ack", Any, False)])
+    in_msg_decoder = msgspec.json.Decoder(InMsg)
+
+
+class RoomState:
+    """單個房間的狀態"""
+    __slots__ = ("room_id", "room_json", "slots")
+
+    room_id: str | int
+    room_json: str  # room_id 的 JSON 表示，供模板使用
+    slots: list[Any]  # slots[i] 為玩家 i + 1 的連接，空位為 None
+
+    def __init__(self, room_id, websocket):
+        self.room_id = room_id
+        self.room_json = dumps(room_id)
+        self.slots = [websocket, None]
+
+
+# 房間狀態 {room_id: RoomState}
+# 每個連接的狀態直接掛在 websocket 物件上: room_ref, player_number, send_queue, writer_task
+rooms: dict[str | int, RoomState] = {}
+
+# 每個客戶端發送隊列可積壓的最大消息數
+SEND_QUEUE_SIZE = 1024
+# 每個客戶端接收隊列的高水位，超過後暫停讀取 socket
+RECV_QUEUE_SIZE = 1024
+# 單條入站消息的大小上限 (與 websockets 預設的 max_size 相同)
+MAX_MESSAGE_SIZE = 2 ** 20
+# 心跳 ping 的間隔與等待 pong 的超時秒數 (與 websockets 預設相同)
+PING_INTERVAL = 20
+PING_TIMEOUT = 20
 
 # 定義消息類型常量
-MESSAGE_TYPE = {
-    "SUCCESS": "success",  # 成功操作
-    "ERROR": "error",  # 錯誤
-    "ROOM_CREATED": "room_created",  # 房間已創建
-    "ROOM_JOINED": "room_joined",  # 加入房間
-    "ROOM_FULL": "room_full",  # 加入已滿
-    "PLAYER_JOINED": "player_joined",  # 玩家加入通知
-    "PLAYER_LEFT": "player_left",  # 玩家離開通知
-    "DATA_RECEIVED": "data_received",  # 數據接收確認
-    "DATA_TRANSFER": "data_transfer"  # 從其他玩家轉發的數據
-}
+MSG_SUCCESS = "success"  # 成功操作
+MSG_ERROR = "error"  # 錯誤
+MSG_ROOM_CREATED = "room_created"  # 房間已創建
+MSG_ROOM_JOINED = "room_joined"  # 加入房間
+MSG_ROOM_FULL = "room_full"  # 加入已滿
+MSG_PLAYER_JOINED = "player_joined"  # 玩家加入通知
+MSG_PLAYER_LEFT = "player_left"  # 玩家離開通知
+MSG_DATA_RECEIVED = "data_received"  # 數據接收確認
+MSG_DATA_TRANSFER = "data_transfer"  # 從其他玩家轉發的數據
+
+# 轉發消息的固定前綴，原始 JSON 直接拼接在其後，無需重新解析與序列化
+FORWARD_PREFIX = dumps({
+    "status": MSG_DATA_TRANSFER,
+    "message": "Received data from another player",
+})[:-1] + ',"data":'
+
+# 房間編號只允許字母、數字、底線與連字號，因此可不經轉義直接填入模板
+ROOM_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+# 整數房間編號必須在 64 位範圍內，否則 orjson 無法序列化
+ROOM_ID_INT_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def template(obj):
+    """將消息序列化為 %-格式模板，值為 "%s"/"%d" 的欄位去掉引號以原樣填入 JSON 值"""
+    return dumps(obj).replace('"%s"', "%s").replace('"%d"', "%d")
+
+
+# 固定結構消息的 JSON 模板，註釋中為依序填入的參數
+# (room_id, room_json)
+ROOM_CREATED_TMPL = template({
+    "status": MSG_ROOM_CREATED,
+    "message": "Room %s has been created. You are player 1",
+    "data": {"room_id": "%s", "player_number": 1, "current_players_count": 1, "max_players": 2}
+})
+# (room_id, player_number, room_json, player_number)
+ROOM_JOINED_TMPL = template({
+    "status": MSG_ROOM_JOINED,
+    "message": "You have joined room %s. You are player %d",
+    "data": {"room_id": "%s", "player_number": "%d", "current_players_count": 2, "max_players": 2,
+             "players": [1, 2]}
+})
+# (room_json,)
+ROOM_FULL_TMPL = template({
+    "status": MSG_ROOM_FULL,
+    "message": "Room is full. Cannot join",
+    "data": {"room_id": "%s", "current_players_count": 2, "max_players": 2}
+})
+# (player_number, room_json, player_number)
+PLAYER_JOINED_TMPL = template({
+    "status": MSG_PLAYER_JOINED,
+    "message": "Player %d has joined the room",
+    "data": {"room_id": "%s", "player_number": "%d", "current_players_count": 2, "players": [1, 2]}
+})
+# (player_number, room_id, room_json, player_number, remaining_player_number)
+PLAYER_LEFT_TMPL = template({
+    "status": MSG_PLAYER_LEFT,
+    "message": "Player %d has left room %s",
+    "data": {"room_id": "%s", "player_number": "%d", "current_players_count": 1, "players": ["%d"]}
+})
+# (room_json, recipients_count, current_players_count)
+DATA_RECEIVED_TMPL = template({
+    "status": MSG_DATA_RECEIVED,
+    "message": "Data received and forwarded",
+    "data": {"room_id": "%s", "recipients_count": "%d", "current_players_count": "%d"}
+})
+
+# 預先序列化的固定錯誤回應
+ERR_INVALID_JSON = dumps({
+    "status": MSG_ERROR,
+    "message": "Invalid data format. Please provide correct JSON",
+    "data": None
+})
+ERR_MISSING_ROOM_ID = dumps({
+    "status": MSG_ERROR,
+    "message": "Missing required parameter: room_id",
+    "data": None
+})
+ERR_INVALID_ROOM_ID = dumps({
+    "status": MSG_ERROR,
+    "message": "Invalid room_id. Use letters, digits, '_' and '-', or a 64-bit integer",
+    "data": None
+})
+
+
+async def client_writer(websocket, queue):
+    """持續取出發送隊列中的消息並依序寫出"""
+    while True:
+        frame = await queue.get()
+        try:
+            await websocket.send(frame)
+        except websockets.exceptions.ConnectionClosed:
+            # 連接的清理由該客戶端自己的 handler 負責，這裡只停止接收新的消息
+            logger.warning("客戶端已斷開連接，停止發送: %s", id(websocket))
+            websocket.writer_task = None
+            stop_writer(websocket)
+            return
+        except Exception as e:
+            logger.error("轉發數據時發生錯誤: %s", e)
+
+
+def start_writer(websocket):
+    """為加入房間的客戶端建立發送隊列與寫出任務"""
+    if websocket.send_queue is not None:
+        return
+    websocket.send_queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+    websocket.writer_task = asyncio.create_task(client_writer(websocket, websocket.send_queue))
+
+
+def stop_writer(websocket):
+    """停止客戶端的寫出任務並丟棄未發送的消息"""
+    queue = websocket.send_queue
+    if queue is None:
+        return
+    if websocket.writer_task is not None:
+        websocket.writer_task.cancel()
+    websocket.send_queue = websocket.writer_task = None
+    # 清空隊列以喚醒等待空位的發送者，否則它們會永遠阻塞在已廢棄的隊列上
+    while not queue.empty():
+        queue.get_nowait()
+
+
+async def enqueue(client, message):
+    """將消息放入客戶端的發送隊列，成功時返回 True
+
+    隊列已滿時等待空位而非丟棄或斷開，背壓由此傳回發送過快的一方的接收循環，
+    不會因對方刷屏而斷開正常讀取的客戶端。
+    """
+    queue = client.send_queue
+    if queue is None:
+        return False
+    await queue.put(message)
+    # 等待期間客戶端可能已斷開，其隊列已被丟棄
+    return client.send_queue is queue
+
+
+async def reply(websocket, message):
+    """回覆發送者，已加入房間時經由其發送隊列寫出以與轉發消息保持順序
+
+    隊列已滿時在此等待，隊列上限即作為限制該客戶端未完成發送數量的信號量。
+    """
+    if websocket.send_queue is None:
+        await websocket.send(message)
+    else:
+        await enqueue(websocket, message)
+
+
+def parse_message(message):
+    """解析並校驗入站消息，返回 (room_id, 是否需要確認, 錯誤回應)，校驗通過時錯誤回應為 None"""
+    if msgspec is not None:
+        try:
+            msg = in_msg_decoder.decode(message)
+        except msgspec.ValidationError:
+            logger.warning("缺少必要參數 room_id")
+            return None, False, ERR_MISSING_ROOM_ID
+        except msgspec.DecodeError:
+            logger.error("無效的 JSON 格式: %s", message)
+            return None, False, ERR_INVALID_JSON
+        room_id, ack = msg.room_id, bool(msg.ack)
+    else:
+        try:
+            data = orjson.loads(message)
+        except orjson.JSONDecodeError:
+            logger.error("無效的 JSON 格式: %s", message)
+            return None, False, ERR_INVALID_JSON
+
+        room_id = data.get("room_id") if isinstance(data, dict) else None
+        # orjson 將超出 64 位的整數解析為 float (已損失精度)，與 msgspec 路徑一樣回覆無效的 room_id
+        if type(room_id) is float and room_id.is_integer() and abs(room_id) >= 2 ** 63:
+            logger.warning("無效的 room_id: %s", room_id)
+            return None, False, ERR_INVALID_ROOM_ID
+        if type(room_id) not in (str, int):
+            logger.warning("缺少必要參數 room_id")
+            return None, False, ERR_MISSING_ROOM_ID
+        ack = bool(data.get("ack"))
+
+    if type(room_id) is str:
+        valid = ROOM_ID_PATTERN.fullmatch(room_id) is not None
+    else:
+        valid = room_id in ROOM_ID_INT_RANGE
+    if not valid:
+        logger.warning("無效的 room_id: %s", room_id)
+        return None, False, ERR_INVALID_ROOM_ID
+    return room_id, ack, None
+
+
+async def process_message(websocket, message: str | bytes) -> None:
+    """處理單條入站消息：校驗後創建/加入房間或轉發數據"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("收到原始消息: %s", message)
+
+    # 二進制幀先解碼為文字，轉發時需原樣拼接，因此必須是合法的 UTF-8
+    if isinstance(message, bytes):
+        try:
+            message = message.decode()
+        except UnicodeDecodeError:
+            logger.error("無效的 JSON 格式: %r", message)
+            await reply(websocket, ERR_INVALID_JSON)
+            return
+
+    room_id, ack, error = parse_message(message)
+    if error is not None:
+        await reply(websocket, error)
+        return
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("處理房間 %s 的消息", room_id)
+
+    # 處理創建房間
+    if room_id not in rooms:
+        room = rooms[room_id] = websocket.room_ref = RoomState(room_id, websocket)
+        websocket.player_number = 1
+        start_writer(websocket)
+
+        await reply(websocket, ROOM_CREATED_TMPL % (room_id, room.room_json))
+        logger.info("玩家 1 創建了房間 %s", room_id)
+        return
+
+    # 處理加入房間
+    room = rooms[room_id]
+    slots = room.slots
+    if websocket not in slots:
+        if None not in slots:
+            await reply(websocket, ROOM_FULL_TMPL % room.room_json)
+            logger.info("有玩家嘗試加入房間 %s，但房間已滿", room_id)
+            return
+
+        # 查找可用的玩家編號 (優先使用最小可用編號)
+        player_number = 1 if slots[0] is None else 2
+
+        # 更新房間狀態
+        slots[player_number - 1] = websocket
+        websocket.room_ref = room
+        websocket.player_number = player_number
+        start_writer(websocket)
+
+        # 通知加入者 (空房間會被移除，因此加入後房間必定滿員)
+        room_json = room.room_json
+        await reply(websocket, ROOM_JOINED_TMPL % (room_id, player_number, room_json, player_number))
+        logger.info("玩家 %s 加入了房間 %s", player_number, room_id)
+
+        # 通知其他玩家 (只序列化一次)
+        notify_msg = PLAYER_JOINED_TMPL % (player_number, room_json, player_number)
+        for i, client in enumerate(slots):
+            if client is not None and client is not websocket:
+                if await enqueue(client, notify_msg) and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("通知玩家 %s 有新玩家加入", i + 1)
+
+    # 轉發玩家數據
+    else:  # 玩家已在房間中
+        player_number = 1 if slots[0] is websocket else 2
+
+        # 轉發原始數據，將已校驗的原始 JSON 拼接到統一格式中
+        json_msg = f'{FORWARD_PREFIX}{message},"from_player":{player_number}}}'
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("準備發送數據: %s", json_msg)
+
+        # 轉發給其他玩家 (不發給自己)
+        forward_count = 0
+        for i, client in enumerate(slots):
+            if client is not None and client is not websocket and await enqueue(client, json_msg):
+                forward_count += 1
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("已轉發數據給玩家 %s", i + 1)
+
+        # 確認轉發狀態
+        if forward_count == 0 and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("房間 %s 中沒有其他玩家，數據未轉發", room_id)
+
+        # 發送者要求確認時才回覆數據已接收，避免每幀多一次往返
+        if ack:
+            await reply(websocket, DATA_RECEIVED_TMPL % (room.room_json, forward_count, 2 - slots.count(None)))
 
 
 async def handler(websocket):
-    logger.info(f"新的連接已建立: {id(websocket)}")
+    logger.info("新的連接已建立: %s", id(websocket))
+    websocket.room_ref = None
+    websocket.player_number = None
+    websocket.send_queue = None
+    websocket.writer_task = None
 
     try:
         async for message in websocket:
-            logger.info(f"收到原始消息: {message}")
-
-            try:
-                data = json.loads(message)
-                logger.info(f"解析後的數據: {data}")
-            except json.JSONDecodeError:
-                logger.error(f"無效的 JSON 格式: {message}")
-                await websocket.send(json.dumps({
-                    "status": MESSAGE_TYPE["ERROR"],
-                    "message": "Invalid data format. Please provide correct JSON",
-                    "data": None
-                }))
-                continue
-
-            if not isinstance(data, dict) or "room_id" not in data:
-                logger.warning("缺少必要參數 room_id")
-                await websocket.send(json.dumps({
-                    "status": MESSAGE_TYPE["ERROR"],
-                    "message": "Missing required parameter: room_id",
-                    "data": None
-                }))
-                continue
-
-            room_id = data.get("room_id")
-
-            logger.info(f"處理房間 {room_id} 的消息")
-
-            # 處理創建房間
-            if room_id not in rooms:
-                rooms[room_id] = {
-                    "clients": [websocket],
-                    "players": {websocket: 1},
-                    "used_player_numbers": {1: True}  # 記錄已使用的玩家編號
-                }
-                client_rooms[websocket] = room_id
-
-                await websocket.send(json.dumps({
-                    "status": MESSAGE_TYPE["ROOM_CREATED"],
-                    "message": f"Room {room_id} has been created. You are player 1",
-                    "data": {
-                        "room_id": room_id,
-                        "player_number": 1,
-                        "current_players_count": 1,  # 添加當前玩家數量
-                        "max_players": 2  # 添加最大玩家數量
-                    }
-                }))
-                logger.info(f"玩家 1 創建了房間 {room_id}")
-                continue
-
-            # 處理加入房間
-            room = rooms[room_id]
-            if websocket not in room["clients"]:
-                if len(room["clients"]) >= 2:
-                    await websocket.send(json.dumps({
-                        "status": MESSAGE_TYPE["ROOM_FULL"],
-                        "message": "Room is full. Cannot join",
-                        "data": {
-                            "room_id": room_id,
-                            "current_players_count": len(room["clients"]),  # 添加當前玩家數量
-                            "max_players": 2  # 添加最大玩家數量
-                        }
-                    }))
-                    logger.info(f"有玩家嘗試加入房間 {room_id}，但房間已滿")
-                    continue
-
-                # 查找可用的玩家編號 (優先使用最小可用編號)
-                available_numbers = [i for i in range(1, 3) if
-                                     i not in [room["players"][client] for client in room["clients"]]]
-                player_number = min(available_numbers) if available_numbers else 2
-
-                # 更新房間狀態
-                room["clients"].append(websocket)
-                room["players"][websocket] = player_number
-                room["used_player_numbers"] = room["used_player_numbers"] if "used_player_numbers" in room else {}
-                room["used_player_numbers"][player_number] = True
-                client_rooms[websocket] = room_id
-
-                # 獲取所有玩家編號列表
-                players_list = list(room["players"].values())
-                current_players_count = len(room["clients"])
-
-                # 通知加入者
-                await websocket.send(json.dumps({
-                    "status": MESSAGE_TYPE["ROOM_JOINED"],
-                    "message": f"You have joined room {room_id}. You are player {player_number}",
-                    "data": {
-                        "room_id": room_id,
-                        "player_number": player_number,
-                        "current_players_count": current_players_count,  # 添加當前玩家數量
-                        "max_players": 2,  # 添加最大玩家數量
-                        "players": players_list  # 添加玩家列表
-                    }
-                }))
-                logger.info(f"玩家 {player_number} 加入了房間 {room_id}")
-
-                # 通知其他玩家
-                for client in room["clients"]:
-                    if client != websocket:
-                        try:
-                            await client.send(json.dumps({
-                                "status": MESSAGE_TYPE["PLAYER_JOINED"],
-                                "message": f"Player {player_number} has joined the room",
-                                "data": {
-                                    "room_id": room_id,
-                                    "player_number": player_number,
-                                    "current_players_count": current_players_count,  # 添加當前玩家數量
-                                    "players": players_list  # 添加玩家列表
-                                }
-                            }))
-                            logger.info(f"通知玩家 {room['players'][client]} 有新玩家加入")
-                        except Exception as e:
-                            logger.error(f"通知失敗: {e}")
-
-            # 轉發玩家數據
-            else:  # 玩家已在房間中
-                player_number = room["players"][websocket]
-
-                # 轉發原始數據，但使用統一結構
-                original_data = data.copy()  # 保存原始數據副本
-
-                # 轉發給其他玩家
-                forward_count = 0
-                for client in list(room["clients"]):
-                    if client == websocket:  # 不發給自己
-                        continue
-
-                    try:
-                        # 包裝數據到統一格式
-                        forward_msg = {
-                            "status": MESSAGE_TYPE["DATA_TRANSFER"],
-                            "message": "Received data from another player",
-                            "data": original_data,
-                            "from_player": player_number
-                        }
-
-                        json_msg = json.dumps(forward_msg)
-                        logger.info(f"準備發送數據: {json_msg}")
-                        await client.send(json_msg)
-                        forward_count += 1
-                        logger.info(f"已轉發數據給玩家 {room['players'][client]}")
-                    except websockets.exceptions.ConnectionClosed:
-                        logger.warning(f"客戶端已斷開連接，無法發送訊息，準備清理")
-                        await cleanup_player(client)
-                    except Exception as e:
-                        logger.error(f"轉發數據時發生錯誤: {e}")
-
-                # 確認轉發狀態
-                if forward_count == 0:
-                    logger.warning(f"房間 {room_id} 中沒有其他玩家，數據未轉發")
-
-                # 回覆發送者數據已接收
-                await websocket.send(json.dumps({
-                    "status": MESSAGE_TYPE["DATA_RECEIVED"],
-                    "message": "Data received and forwarded",
-                    "data": {
-                        "room_id": room_id,
-                        "recipients_count": forward_count,
-                        "current_players_count": len(room["clients"])  # 添加當前玩家數量
-                    }
-                }))
+            await process_message(websocket, message)
 
     except websockets.exceptions.ConnectionClosed as e:
-        logger.info(f"連接關閉: {e}, 客戶端: {id(websocket)}")
+        logger.info("連接關閉: %s, 客戶端: %s", e, id(websocket))
     except Exception as e:
-        logger.error(f"處理消息時發生錯誤: {str(e)}")
+        logger.error("處理消息時發生錯誤: %s", e)
     finally:
         # 確保斷線時清理玩家
         await cleanup_player(websocket)
-        logger.info(f"連接已清理: {id(websocket)}")
+        logger.info("連接已清理: %s", id(websocket))
 
 
 async def cleanup_player(websocket):
     """清理斷線的玩家"""
-    logger.info(f"開始清理斷線的玩家: {id(websocket)}")
+    logger.info("開始清理斷線的玩家: %s", id(websocket))
+    stop_writer(websocket)
 
     # 查找此客戶端在哪個房間
-    room_id = client_rooms.pop(websocket, None)
-    if room_id is None:
-        logger.info(f"客戶端不在任何房間中: {id(websocket)}")
+    room = websocket.room_ref
+    if room is None:
+        logger.info("客戶端不在任何房間中: %s", id(websocket))
         return
+    websocket.room_ref = None
+    room_id = room.room_id
+    player_number = websocket.player_number
 
-    room = rooms.get(room_id)
-    if room is None:
-        logger.info(f"房間 {room_id} 不存在")
+    if rooms.get(room_id) is not room:
+        logger.info("房間 %s 不存在", room_id)
         return
 
-    if websocket in room["clients"]:
-        player_number = room["players"].pop(websocket, None)
+    slots = room.slots
+    if slots[player_number - 1] is websocket:
         # 釋放玩家編號
-        if "used_player_numbers" in room and player_number in room["used_player_numbers"]:
-            del room["used_player_numbers"][player_number]
-
-        room["clients"].remove(websocket)
-        logger.info(f"玩家 {player_number} 已從房間 {room_id} 中移除")
+        slots[player_number - 1] = None
+        logger.info("玩家 %s 已從房間 %s 中移除", player_number, room_id)
 
-        # 獲取更新後的玩家列表和數量
-        players_list = list(room["players"].values())
-        current_players_count = len(room["clients"])
-
-        # 通知房間內其他玩家
-        for client in list(room["clients"]):
-            try:
-                await client.send(json.dumps({
-                    "status": MESSAGE_TYPE["PLAYER_LEFT"],
-                    "message": f"Player {player_number} has left room {room_id}",
-                    "data": {
-                        "room_id": room_id,
-                        "player_number": player_number,
-                        "current_players_count": current_players_count,  # 添加當前玩家數量
-                        "players": players_list  # 添加玩家列表
-                    }
-                }))
-                logger.info(f"通知玩家 {room['players'][client]} 有玩家離開")
-            except Exception as e:
-                logger.error(f"通知玩家離開時出錯: {e}")
+        # 剩下的另一位玩家
+        remaining_number = 3 - player_number
+        remaining = slots[remaining_number - 1]
 
         # 如果房間空了，移除房間
-        if not room["clients"]:
+        if remaining is None:
             del rooms[room_id]
-            logger.info(f"房間 {room_id} 已被移除")
+            logger.info("房間 %s 已被移除", room_id)
+            return
+
+        # 通知房間內其他玩家
+        notify_msg = PLAYER_LEFT_TMPL % (player_number, room_id, room.room_json, player_number, remaining_number)
+        if await enqueue(remaining, notify_msg) and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("通知玩家 %s 有玩家離開", remaining_number)
+
+
+# 以普通 Python 類編譯：mypyc 原生類與 Cython 的 WSListener 佈局衝突，會調用錯誤的方法。
+# picows 為可選依賴，WSListener 基類在 main 中運行時混入
+@mypyc_attr(native_class=False)
+class PicowsConnection:
+    """將 picows 的幀回調轉接為 handler 所用的 async for / send 介面"""
+
+    # handler 掛在連接上的狀態
+    room_ref: RoomState | None
+    player_number: int | None
+    send_queue: asyncio.Queue | None
+    writer_task: asyncio.Task | None
+
+    def on_ws_connected(self, transport):
+        self.transport = transport
+        self.inbox = asyncio.Queue()
+        self.reading_paused = False
+        self.fragments = None  # 分片消息的緩衝 (消息類型, [payload, ...])
+        self.fragments_size = 0
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.handler_task = asyncio.create_task(handler(self))
+        self.handler_task.add_done_callback(self.on_handler_done)
+
+    def on_handler_done(self, task):
+        """handler 結束時關閉連接，與 websockets 一致；否則後續消息會堆積在無人讀取的 inbox 中"""
+        if not self.transport.is_disconnected:
+            self.transport.send_close(picows.WSCloseCode.OK)
+            self.transport.disconnect()
+
+    def on_ws_frame(self, transport, frame):
+        msg_type = frame.msg_type
+        if msg_type == picows.WSMsgType.CLOSE:
+            transport.send_close(frame.get_close_code(), frame.get_close_message())
+            transport.disconnect()
+            return
+
+        if msg_type == picows.WSMsgType.CONTINUATION:
+            if self.fragments is None:
+                return
+            self.fragments_size += frame.payload_size
+            if self.fragments_size > MAX_MESSAGE_SIZE:
+                logger.warning("分片消息超過大小上限，斷開連接: %s", id(self))
+                self.fragments = None
+                transport.send_close(picows.WSCloseCode.MESSAGE_TOO_BIG)
+                transport.disconnect()
+                return
+            self.fragments[1].append(frame.get_payload_as_bytes())
+            if not frame.fin:
+                return
+            msg_type, parts = self.fragments
+            self.fragments = None
+            payload = b"".join(parts)
+            self.push(payload.decode() if msg_type == picows.WSMsgType.TEXT else payload)
+        elif msg_type in (picows.WSMsgType.TEXT, picows.WSMsgType.BINARY):
+            if not frame.fin:
+                self.fragments = (msg_type, [frame.get_payload_as_bytes()])
+                self.fragments_size = frame.payload_size
+                return
+            if msg_type == picows.WSMsgType.TEXT:
+                self.push(frame.get_payload_as_utf8_text())
+            else:
+                self.push(frame.get_payload_as_bytes())
+
+    def push(self, message):
+        """放入接收隊列，達到高水位時暫停讀取 socket，與 websockets 的 max_queue 行為一致"""
+        self.inbox.put_nowait(message)
+        if not self.reading_paused and self.inbox.qsize() >= RECV_QUEUE_SIZE:
+            self.reading_paused = True
+            self.transport.underlying_transport.pause_reading()
+
+    def on_ws_disconnected(self, transport):
+        self.writable.set()
+        self.inbox.put_nowait(None)
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        if self.reading_paused and self.inbox.qsize() <= RECV_QUEUE_SIZE // 4:
+            self.reading_paused = False
+            if not self.transport.is_disconnected:
+                self.transport.underlying_transport.resume_reading()
+        return message
+
+    async def send(self, message):
+        # 寫緩衝超過高水位時等待排空，保持與 websockets 相同的背壓行為
+        if not self.writable.is_set():
+            await self.writable.wait()
+        if isinstance(message, str):
+            self.transport.send(picows.WSMsgType.TEXT, message.encode())
+        else:
+            self.transport.send(picows.WSMsgType.BINARY, message)
 
 
 async def main():
-    async with websockets.serve(handler, "0.0.0.0", 8765):
+    if picows is not None:
+        # picows 以 Cython 實現幀解析與掩碼處理，每幀開銷遠低於純 Python 的 websockets
+        # 單幀大小、心跳設定與 websockets 預設保持一致，以便及時發現半開連接
+        listener_type = type("PicowsListener", (PicowsConnection, picows.WSListener), {})
+        server = await picows.ws_create_server(lambda request: listener_type(), "0.0.0.0", 8765,
+                                               max_frame_size=MAX_MESSAGE_SIZE,
+                                               enable_auto_ping=True,
+                                               auto_ping_idle_timeout=PING_INTERVAL,
+                                               auto_ping_reply_timeout=PING_TIMEOUT)
+    else:
+        # 放寬接收隊列上限以減少背壓暫停，並關閉對小型 JSON 不划算的 permessage-deflate 壓縮
+        server = websockets.serve(handler, "0.0.0.0", 8765, max_queue=RECV_QUEUE_SIZE, compression=None)
+
+    async with server:
         logger.info("WebSocket 伺服器已啟動，在 ws://localhost:8765 上運行")
         await asyncio.Future()  # 運行直到手動停止伺服器
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop  # type: ignore[import-not-found]
+    except ImportError:  # 未安裝 uvloop 時使用預設事件循環
+        asyncio.run(main())
+    else:
+        uvloop.run(main())